@@ -1,87 +1,148 @@
 import argparse
-import glob
+import re
 import shutil
 import subprocess
+import tarfile
+import threading
 from pathlib import Path
-from tempfile import TemporaryDirectory
+from tempfile import TemporaryDirectory, mkdtemp
 
 ROOT_DIR = Path(__file__).parent.parent.resolve()
 HEADERS_DIR = ROOT_DIR / "executorch-sys" / "third-party" / "executorch"
 
 
+def glob_to_regex(pattern):
+    # fnmatch.translate() lets '*' match across '/' and doesn't treat '**' as
+    # zero or more directories, so translate the glob patterns ourselves
+    components = pattern.split("/")
+    regex = ""
+    for i, component in enumerate(components):
+        last = i == len(components) - 1
+        if component == "**":
+            regex += ".*" if last else "(?:.*/)?"
+        else:
+            regex += re.escape(component).replace(r"\*", "[^/]*")
+            if not last:
+                regex += "/"
+    return regex
+
+
+INCLUDES = [
+    "runtime/core/**/*.h",
+    "runtime/executor/**/*.h",
+    "runtime/platform/**/*.h",
+    "runtime/kernel/operator_registry.h",
+    "runtime/backend/options.h",
+    "runtime/backend/backend_options_map.h",
+    "extension/data_loader/**/*.h",
+    "extension/memory_allocator/**/*.h",
+    "extension/module/**/*.h",
+    "extension/tensor/tensor_ptr.h",
+    "extension/flat_tensor/**/*.h",
+    "devtools/etdump/etdump_flatcc.h",
+    "devtools/etdump/data_sinks/buffer_data_sink.h",
+    "devtools/etdump/data_sinks/data_sink_base.h",
+    "LICENSE",
+    "version.txt",
+]
+EXCLUDES = [
+    "runtime/executor/platform_memory_allocator.h",
+    "runtime/executor/program_validation.h",
+    "runtime/platform/compat_unistd.h",
+    "runtime/core/exec_aten/util/tensor_shape_to_c_string.h",
+    "runtime/core/defines.h",
+    "runtime/core/portable_type/c10/c10/util/overflows.h",
+    "runtime/core/function_ref.h",
+    "extension/data_loader/file_descriptor_data_loader.h",
+    "extension/data_loader/mman.h",
+    "extension/data_loader/mman_windows.h",
+    "extension/module/bundled_module.h",  # TODO
+    "runtime/core/device_allocator.h",  # TODO
+    "runtime/core/device_memory_buffer.h",  # TODO
+    "extension/flat_tensor/serialize/serialize.h",
+    "**/test/**",
+    "**/testing_util/**",
+]
+INCLUDE_RE = re.compile("|".join(map(glob_to_regex, INCLUDES)))
+EXCLUDE_RE = re.compile("|".join(map(glob_to_regex, EXCLUDES)))
+
+
 def main():
     parser = argparse.ArgumentParser(description="Download executorch Cpp headers")
     parser.add_argument("version", type=str, help="executorch version")
     args = parser.parse_args()
 
+    # Move the old headers aside and delete them in the background, while the
+    # new ones are downloaded. They are moved out of executorch-sys, so leftovers
+    # of an interrupted run are never packaged with the crate.
     if HEADERS_DIR.exists():
-        shutil.rmtree(HEADERS_DIR)
+        old_headers_dir = Path(mkdtemp(prefix=".old-headers-", dir=ROOT_DIR / "etc"))
+        HEADERS_DIR.rename(old_headers_dir / "executorch")
+    old_headers_dirs = list((ROOT_DIR / "etc").glob(".old-headers-*"))
+    remove_old_headers = None
+    if old_headers_dirs:
+        remove_old_headers = threading.Thread(
+            target=remove_dirs, args=(old_headers_dirs,)
+        )
+        remove_old_headers.start()
     HEADERS_DIR.mkdir(parents=True)
 
     with TemporaryDirectory() as tmpdir:
+        # Clone only the commit and trees, the blobs of the selected files are
+        # fetched by 'git archive' below
         subprocess.check_call(
             [
                 "git",
                 "clone",
                 "--depth",
                 "1",
+                "--filter=blob:none",
+                "--no-checkout",
                 "--branch",
                 f"v{args.version}",
                 "https://github.com/pytorch/executorch.git",
             ],
             cwd=tmpdir,
         )
-        tmp_headers_dir = Path(tmpdir) / "executorch"
-
-        includes = [
-            "runtime/core/**/*.h",
-            "runtime/executor/**/*.h",
-            "runtime/platform/**/*.h",
-            "runtime/kernel/operator_registry.h",
-            "runtime/backend/options.h",
-            "runtime/backend/backend_options_map.h",
-            "extension/data_loader/**/*.h",
-            "extension/memory_allocator/**/*.h",
-            "extension/module/**/*.h",
-            "extension/tensor/tensor_ptr.h",
-            "extension/flat_tensor/**/*.h",
-            "devtools/etdump/etdump_flatcc.h",
-            "devtools/etdump/data_sinks/buffer_data_sink.h",
-            "devtools/etdump/data_sinks/data_sink_base.h",
-            "LICENSE",
-            "version.txt",
-        ]
-        excludes = [
-            "runtime/executor/platform_memory_allocator.h",
-            "runtime/executor/program_validation.h",
-            "runtime/platform/compat_unistd.h",
-            "runtime/core/exec_aten/util/tensor_shape_to_c_string.h",
-            "runtime/core/defines.h",
-            "runtime/core/portable_type/c10/c10/util/overflows.h",
-            "runtime/core/function_ref.h",
-            "extension/data_loader/file_descriptor_data_loader.h",
-            "extension/data_loader/mman.h",
-            "extension/data_loader/mman_windows.h",
-            "extension/module/bundled_module.h",  # TODO
-            "runtime/core/device_allocator.h",  # TODO
-            "runtime/core/device_memory_buffer.h",  # TODO
-            "extension/flat_tensor/serialize/serialize.h",
-            "**/test/**",
-            "**/testing_util/**",
+        repo_dir = Path(tmpdir) / "executorch"
+
+        all_files = subprocess.check_output(
+            ["git", "ls-tree", "-r", "-z", "--name-only", "HEAD"],
+            cwd=repo_dir,
+            text=True,
+        ).split("\0")
+        files = [
+            f
+            for f in all_files
+            if INCLUDE_RE.fullmatch(f) and not EXCLUDE_RE.fullmatch(f)
         ]
 
-        files = set()
-        for include in includes:
-            files.update(glob.glob(include, root_dir=tmp_headers_dir, recursive=True))
-        for exclude in excludes:
-            files.difference_update(
-                glob.glob(exclude, root_dir=tmp_headers_dir, recursive=True)
-            )
-        for f in files:
-            dst = HEADERS_DIR / f
-            if not dst.parent.exists():
-                dst.parent.mkdir(parents=True)
-            shutil.copy(tmp_headers_dir / f, HEADERS_DIR / f)
+        # Extract the selected files directly into the headers dir, without
+        # checking them out in the temp dir first
+        archive = subprocess.Popen(
+            [
+                *["git", "--literal-pathspecs", "archive"],
+                *["--format=tar", "HEAD", "--", *files],
+            ],
+            cwd=repo_dir,
+            stdout=subprocess.PIPE,
+        )
+        try:
+            with tarfile.open(fileobj=archive.stdout, mode="r|") as tar:
+                tar.extractall(HEADERS_DIR, filter="data")
+        finally:
+            # A git failure also breaks the tar stream, report the git error
+            archive.stdout.close()
+            if archive.wait() != 0:
+                raise subprocess.CalledProcessError(archive.returncode, archive.args)
+
+    if remove_old_headers is not None:
+        remove_old_headers.join()
+
+
+def remove_dirs(dirs):
+    for d in dirs:
+        shutil.rmtree(d)
 
 
 if __name__ == "__main__":
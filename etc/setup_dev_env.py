@@ -1,9 +1,12 @@
 import argparse
+import hashlib
 import multiprocessing
+import os
 import platform
 import shutil
 import subprocess
 import sys
+import threading
 import warnings
 from pathlib import Path
 
@@ -26,8 +29,18 @@ def main():
     )
     args = parser.parse_args()
 
+    # Move the old executorch dir aside and delete it in the background, while
+    # the new one is cloned and built
+    remove_old_executorch = None
     if args.clean and DEV_EXECUTORCH_DIR.exists():
-        shutil.rmtree(DEV_EXECUTORCH_DIR)
+        old_executorch_dir = DEV_EXECUTORCH_DIR.with_suffix(".old")
+        if old_executorch_dir.exists():
+            shutil.rmtree(old_executorch_dir)
+        DEV_EXECUTORCH_DIR.rename(old_executorch_dir)
+        remove_old_executorch = threading.Thread(
+            target=shutil.rmtree, args=(old_executorch_dir,)
+        )
+        remove_old_executorch.start()
 
     # TODO setup a venv here
 
@@ -35,33 +48,43 @@ def main():
     patch_flatcc_werror()
 
     subprocess.check_call([sys.executable, "-m", "ensurepip"])
+    pip_packages = ["huggingface_hub[cli]"]
     if not args.skip_executorch_python:
         subprocess.check_call(
             [sys.executable, "install_executorch.py", "--use-pt-pinned-commit"],
             cwd=DEV_EXECUTORCH_DIR,
         )
     else:
-        subprocess.check_call(
-            [
-                sys.executable,
-                "-m",
-                "pip",
-                "install",
-                "-r",
-                DEV_EXECUTORCH_DIR / "requirements-dev.txt",
-                "torch==2.12.0",
-                "--extra-index-url",
-                "https://download.pytorch.org/whl/test/cpu",
-            ]
-        )
-    build_executorch_with_dev_cfg()
-
+        pip_packages += [
+            *["-r", DEV_EXECUTORCH_DIR / "requirements-dev.txt"],
+            "torch==2.12.0",
+            *["--extra-index-url", "https://download.pytorch.org/whl/test/cpu"],
+        ]
+    # Install all the packages in a single pip invocation to resolve them once
     subprocess.check_call(
-        [sys.executable, "-m", "pip", "install", "huggingface_hub[cli]"]
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            "--disable-pip-version-check",
+            *pip_packages,
+        ],
+        env={**os.environ, "PIP_NO_INPUT": "1", "PYTHONDONTWRITEBYTECODE": "1"},
     )
 
+    build_executorch_with_dev_cfg()
+
+    if remove_old_executorch is not None:
+        remove_old_executorch.join()
+
 
 def clone_executorch():
+    # Written once the clone and its submodules are fully initialized
+    setup_complete = DEV_EXECUTORCH_DIR / ".setup_complete"
+    if setup_complete.exists():
+        return
+
     if not DEV_EXECUTORCH_DIR.exists():
         DEV_EXECUTORCH_DIR.mkdir(parents=True, exist_ok=True)
         subprocess.check_call(
@@ -94,43 +117,90 @@ def clone_executorch():
                 cwd=DEV_EXECUTORCH_DIR / "backends" / "apple" / "coreml" / "scripts",
             )
 
-    subprocess.check_call(
-        ["git", "submodule", "update", "--init", "--recursive"], cwd=DEV_EXECUTORCH_DIR
-    )
-    subprocess.check_call(
-        ["git", "submodule", "sync", "--recursive"], cwd=DEV_EXECUTORCH_DIR
+    if not submodules_up_to_date():
+        # Fetch the submodules in parallel, and without their (large) history
+        subprocess.check_call(
+            [
+                *["git", "-c", "submodule.fetchJobs=16"],
+                *["submodule", "update", "--init", "--recursive"],
+                *["--depth", "1", "--recommend-shallow", "--jobs", "16"],
+            ],
+            cwd=DEV_EXECUTORCH_DIR,
+        )
+        subprocess.check_call(
+            ["git", "submodule", "sync", "--recursive"], cwd=DEV_EXECUTORCH_DIR
+        )
+
+    setup_complete.touch()
+
+
+def submodules_up_to_date():
+    if not (DEV_EXECUTORCH_DIR / ".git" / "modules").exists():
+        return False
+    status = subprocess.check_output(
+        ["git", "submodule", "status", "--recursive"],
+        cwd=DEV_EXECUTORCH_DIR,
+        text=True,
     )
+    # '-' marks an uninitialized submodule, '+' a submodule at the wrong commit
+    # and 'U' a submodule with merge conflicts
+    return not any(line.startswith(("-", "+", "U")) for line in status.splitlines())
 
 
 def build_executorch_with_dev_cfg():
     cmake_out_dir = DEV_EXECUTORCH_DIR / "cmake-out"
     if not cmake_out_dir.exists():
         cmake_out_dir.mkdir()
-    subprocess.check_call(
-        [
-            "cmake",
-            "-DCMAKE_BUILD_TYPE=Release",
-            f"-DPYTHON_EXECUTABLE={sys.executable}",
-            "-DEXECUTORCH_BUILD_EXECUTOR_RUNNER=OFF",
-            "-DEXECUTORCH_BUILD_EXTENSION_RUNNER_UTIL=OFF",
-            "-DEXECUTORCH_ENABLE_PROGRAM_VERIFICATION=ON",
-            "-DEXECUTORCH_ENABLE_LOGGING=ON",
-            "-DEXECUTORCH_BUILD_PORTABLE_OPS=ON",
-            "-DEXECUTORCH_BUILD_EXTENSION_DATA_LOADER=ON",
-            "-DEXECUTORCH_BUILD_EXTENSION_FLAT_TENSOR=ON",
-            "-DEXECUTORCH_BUILD_EXTENSION_NAMED_DATA_MAP=ON",
-            "-DEXECUTORCH_BUILD_EXTENSION_MODULE=ON",
-            "-DEXECUTORCH_BUILD_EXTENSION_TENSOR=ON",
-            "-DEXECUTORCH_BUILD_XNNPACK=ON",
-            "-DEXECUTORCH_BUILD_KERNELS_QUANTIZED=ON",
-            "-DEXECUTORCH_BUILD_KERNELS_OPTIMIZED=ON",
-            "-DEXECUTORCH_BUILD_KERNELS_CUSTOM=ON",
-            "-DEXECUTORCH_BUILD_DEVTOOLS=ON",
-            "-DEXECUTORCH_ENABLE_EVENT_TRACER=ON",
-            "..",
-        ],
-        cwd=DEV_EXECUTORCH_DIR / "cmake-out",
-    )
+    cmake_flags = [
+        "-DCMAKE_BUILD_TYPE=Release",
+        f"-DPYTHON_EXECUTABLE={sys.executable}",
+        "-DEXECUTORCH_BUILD_EXECUTOR_RUNNER=OFF",
+        "-DEXECUTORCH_BUILD_EXTENSION_RUNNER_UTIL=OFF",
+        "-DEXECUTORCH_ENABLE_PROGRAM_VERIFICATION=ON",
+        "-DEXECUTORCH_ENABLE_LOGGING=ON",
+        "-DEXECUTORCH_BUILD_PORTABLE_OPS=ON",
+        "-DEXECUTORCH_BUILD_EXTENSION_DATA_LOADER=ON",
+        "-DEXECUTORCH_BUILD_EXTENSION_FLAT_TENSOR=ON",
+        "-DEXECUTORCH_BUILD_EXTENSION_NAMED_DATA_MAP=ON",
+        "-DEXECUTORCH_BUILD_EXTENSION_MODULE=ON",
+        "-DEXECUTORCH_BUILD_EXTENSION_TENSOR=ON",
+        "-DEXECUTORCH_BUILD_XNNPACK=ON",
+        "-DEXECUTORCH_BUILD_KERNELS_QUANTIZED=ON",
+        "-DEXECUTORCH_BUILD_KERNELS_OPTIMIZED=ON",
+        "-DEXECUTORCH_BUILD_KERNELS_CUSTOM=ON",
+        "-DEXECUTORCH_BUILD_DEVTOOLS=ON",
+        "-DEXECUTORCH_ENABLE_EVENT_TRACER=ON",
+    ]
+    # Cache compilation results across clean builds
+    compiler_launcher = shutil.which("sccache") or shutil.which("ccache")
+    if compiler_launcher is not None:
+        cmake_flags += [
+            f"-DCMAKE_C_COMPILER_LAUNCHER={compiler_launcher}",
+            f"-DCMAKE_CXX_COMPILER_LAUNCHER={compiler_launcher}",
+        ]
+
+    # Skip the configure step if the build dir was already configured with the
+    # same flags. 'cmake --build' re-configures by itself if a CMakeLists.txt
+    # changed.
+    flags_hash = hashlib.sha256(repr(sorted(cmake_flags)).encode()).hexdigest()
+    flags_hash_file = cmake_out_dir / ".flags_hash"
+    configured = (cmake_out_dir / "CMakeCache.txt").exists()
+    if (
+        not configured
+        or not flags_hash_file.exists()
+        or flags_hash_file.read_text() != flags_hash
+    ):
+        # Invalidate the hash first, a failed configure must not be skipped later
+        flags_hash_file.unlink(missing_ok=True)
+        # The generator of an existing build dir can't be changed
+        generator_flags = []
+        if shutil.which("ninja") and not configured:
+            generator_flags = ["-G", "Ninja"]
+        subprocess.check_call(
+            ["cmake", *cmake_flags, *generator_flags, ".."],
+            cwd=DEV_EXECUTORCH_DIR / "cmake-out",
+        )
+        flags_hash_file.write_text(flags_hash)
 
     subprocess.check_call(
         ["cmake", "--build", "cmake-out", "-j" + str(multiprocessing.cpu_count() + 1)],
@@ -1,6 +1,28 @@
+import hashlib
+import os
 import shutil
+import sys
+import tempfile
+from importlib.metadata import version
 from pathlib import Path
 
+model_dir = Path(__file__).parent.resolve() / "model"
+
+# Skip the export if this script was already run with the same torch and
+# executorch versions. Checked before importing torch and executorch, which are
+# slow to import.
+cache_key = hashlib.sha256(
+    Path(__file__).read_bytes()
+    + version("torch").encode()
+    + version("executorch").encode()
+).hexdigest()[:16]
+cache_dir = Path(__file__).parent.resolve() / ".export_cache" / cache_key
+if cache_dir.exists():
+    if model_dir.exists():
+        shutil.rmtree(model_dir)
+    shutil.copytree(cache_dir, model_dir)
+    sys.exit(0)
+
 import torch
 from executorch.exir import ExecutorchBackendConfig, to_edge_transform_and_lower
 from torch.export import export
@@ -9,8 +31,8 @@ from torch.export import export
 class ModuleAddMul(torch.nn.Module):
     def __init__(self):
         super().__init__()
-        self.a = 3 * torch.ones(2, 2, dtype=torch.float)
-        self.b = 2 * torch.ones(2, 2, dtype=torch.float)
+        self.a = torch.full((2, 2), 3.0, dtype=torch.float)
+        self.b = torch.full((2, 2), 2.0, dtype=torch.float)
 
     def forward(self, x: torch.Tensor):
         out_1 = torch.mul(self.a, x)
@@ -25,10 +47,16 @@ executorch_program = to_edge_transform_and_lower(exported_program).to_executorch
     ExecutorchBackendConfig(external_constants=True)
 )
 
-model_dir = Path(__file__).parent.resolve() / "model"
 if model_dir.exists():
     shutil.rmtree(model_dir)
 model_dir.mkdir(parents=True)
 with open(model_dir / "model.pte", "wb") as file:
     executorch_program.write_to_file(file)
 executorch_program.write_tensor_data_to_file(model_dir)
+
+# Write the cache entry under a temporary name first, so an interrupted run
+# doesn't leave a partial entry behind
+cache_dir.parent.mkdir(exist_ok=True)
+tmp_dir = tempfile.mkdtemp(dir=cache_dir.parent, prefix=".tmp")
+shutil.copytree(model_dir, tmp_dir, dirs_exist_ok=True)
+os.replace(tmp_dir, cache_dir)
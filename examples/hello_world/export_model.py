@@ -1,5 +1,26 @@
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from importlib.metadata import version
 from pathlib import Path
 
+model_path = Path(__file__).parent.parent / "models" / "add.pte"
+
+# Skip the export if this script was already run with the same torch and
+# executorch versions. Checked before importing torch and executorch, which are
+# slow to import.
+cache_key = hashlib.sha256(
+    Path(__file__).read_bytes()
+    + version("torch").encode()
+    + version("executorch").encode()
+).hexdigest()[:16]
+cache_path = Path(__file__).parent / ".export_cache" / f"{cache_key}.pte"
+if cache_path.exists():
+    shutil.copyfile(cache_path, model_path)
+    sys.exit(0)
+
 import torch
 from executorch.exir import to_edge_transform_and_lower
 from torch.export import export
@@ -19,6 +40,13 @@ model = Add()
 exported_program = export(model, (torch.ones(1), torch.ones(1)))
 executorch_program = to_edge_transform_and_lower(exported_program).to_executorch()
 
-model_path = Path(__file__).parent.parent / "models" / "add.pte"
 with open(model_path, "wb") as file:
     file.write(executorch_program.buffer)
+
+# Write the cache entry under a temporary name first, so an interrupted run
+# doesn't leave a truncated entry behind
+cache_path.parent.mkdir(exist_ok=True)
+fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, prefix=".tmp")
+os.close(fd)
+shutil.copyfile(model_path, tmp_path)
+os.replace(tmp_path, cache_path)
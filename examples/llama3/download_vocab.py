@@ -1,6 +1,22 @@
 import json
+import os
+import sys
+from pathlib import Path
 
-from transformers import AutoTokenizer
+# Keep the HuggingFace downloads in a persistent dir that can be cached across
+# runs. Must be set before huggingface_hub is imported.
+os.environ.setdefault("HF_HUB_CACHE", str(Path(__file__).parent.parent / ".hf_cache"))
 
-tokenizer = AutoTokenizer.from_pretrained("meta-llama/Llama-3.2-1B")
-print(json.dumps(tokenizer.vocab))
+from huggingface_hub import hf_hub_download
+
+# Only tokenizer.json is needed, no need to load the full tokenizer
+tokenizer_path = hf_hub_download("meta-llama/Llama-3.2-1B", "tokenizer.json")
+with open(tokenizer_path, encoding="utf-8") as file:
+    tokenizer = json.load(file)
+
+vocab = tokenizer["model"]["vocab"]
+# The special tokens (<|begin_of_text|>, ...) are not part of the model vocab
+for token in tokenizer["added_tokens"]:
+    vocab[token["content"]] = token["id"]
+
+json.dump(vocab, sys.stdout, separators=(",", ":"))
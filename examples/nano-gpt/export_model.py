@@ -1,3 +1,32 @@
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from importlib.metadata import version
+from pathlib import Path
+
+# Keep the HuggingFace and torch hub downloads in persistent dirs that can be
+# cached across runs. Must be set before torch and huggingface_hub are imported.
+examples_dir = Path(__file__).parent.parent
+os.environ.setdefault("HF_HUB_CACHE", str(examples_dir / ".hf_cache"))
+os.environ.setdefault("TORCH_HOME", str(examples_dir / ".torch_cache"))
+
+# Skip the export if this script was already run with the same model code and
+# the same torch and executorch versions. Checked before importing torch and
+# executorch, which are slow to import.
+script_dir = Path(__file__).parent
+cache_key = hashlib.sha256(
+    Path(__file__).read_bytes()
+    + (script_dir / "model.py").read_bytes()
+    + version("torch").encode()
+    + version("executorch").encode()
+).hexdigest()[:16]
+cache_path = script_dir / ".export_cache" / f"{cache_key}.pte"
+if cache_path.exists():
+    shutil.copyfile(cache_path, "nanogpt.pte")
+    sys.exit(0)
+
 import torch
 from executorch.exir import EdgeCompileConfig, to_edge
 from model import GPT
@@ -23,8 +52,9 @@ example_inputs = (
 dynamic_shape = ({1: torch.export.Dim("token_dim", max=model.config.block_size)},)
 
 # Trace the model, converting it to a portable intermediate representation.
-# The torch.no_grad() call tells PyTorch to exclude training-specific logic.
-with torch.nn.attention.sdpa_kernel([SDPBackend.MATH]), torch.no_grad():
+# The torch.inference_mode() call tells PyTorch to exclude training-specific
+# logic, and is cheaper than torch.no_grad() as it also skips version counters.
+with torch.nn.attention.sdpa_kernel([SDPBackend.MATH]), torch.inference_mode():
     m = export_for_training(
         model, example_inputs, dynamic_shapes=dynamic_shape
     ).module()
@@ -38,3 +68,11 @@ et_program = edge_manager.to_executorch()
 # Save the ExecuTorch program to a file.
 with open("nanogpt.pte", "wb") as file:
     file.write(et_program.buffer)
+
+# Write the cache entry under a temporary name first, so an interrupted run
+# doesn't leave a truncated entry behind.
+cache_path.parent.mkdir(exist_ok=True)
+fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, prefix=".tmp")
+os.close(fd)
+shutil.copyfile("nanogpt.pte", tmp_path)
+os.replace(tmp_path, cache_path)
@@ -1,5 +1,9 @@
 import argparse
+import os
+import signal
 import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 parser = argparse.ArgumentParser()
@@ -10,10 +14,15 @@ parser.add_argument(
 )
 args = parser.parse_args()
 
-dir_excludes = ["models"]
+dir_excludes = ["models", ".hf_cache", ".torch_cache"]
 examples_dir = Path(__file__).parent
 examples = [d for d in examples_dir.iterdir() if d.is_dir()]
 examples = [d for d in examples if d.name not in dir_excludes]
+
+# The small examples are independent and are run in parallel, the LLM examples
+# are memory heavy and are run one after the other
+parallel_runs = []
+serial_runs = []
 for example in examples:
     match example.name:
         case (
@@ -24,7 +33,7 @@ for example in examples:
             | "data_map"
             | "etdump"
         ):
-            extra_args = []
+            parallel_runs.append((example, []))
         case "nano-gpt":
             extra_args = [
                 *["--model", "nanogpt.pte"],
@@ -32,6 +41,7 @@ for example in examples:
                 *["--prompt", "hello world"],
                 *["--length", "12"],
             ]
+            serial_runs.append((example, extra_args))
         case "llama3":
             extra_args = [
                 *["--model", "llama3_2.pte"],
@@ -40,15 +50,71 @@ for example in examples:
                 *["--temperature", "0.2"],
                 *["--length", "12"],
             ]
+            serial_runs.append((example, extra_args))
         case unknown:
             raise Exception(f"Unknown example directory: '{unknown}'")
-    print(f"\n=== Running example '{example.name}' ===")
-    subprocess.check_call(
-        [
-            *["cargo", "run"],
-            *["--profile", args.profile],
-            "-q",
-            *["--", *extra_args],
-        ],
-        cwd=example,
-    )
+
+
+def cargo_run_cmd(extra_args):
+    return [
+        *["cargo", "run"],
+        *["--profile", args.profile],
+        "-q",
+        *["--", *extra_args],
+    ]
+
+
+if parallel_runs:
+    # Split the cores between the concurrent builds to avoid oversubscription
+    cpu_count = os.cpu_count() or 1
+    jobs = max(1, cpu_count // len(parallel_runs))
+    env = {**os.environ, "CARGO_BUILD_JOBS": str(jobs)}
+
+    processes = []
+
+    def run_captured(example, extra_args):
+        process = subprocess.Popen(
+            cargo_run_cmd(extra_args),
+            cwd=example,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            # Own process group, so the whole build can be killed on failure
+            start_new_session=True,
+        )
+        processes.append(process)
+        output, _ = process.communicate()
+        return process.returncode, output
+
+    def kill_all():
+        for process in processes:
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    with ThreadPoolExecutor(max_workers=len(parallel_runs)) as executor:
+        futures = {
+            executor.submit(run_captured, example, extra_args): (example, extra_args)
+            for example, extra_args in parallel_runs
+        }
+        try:
+            for future in as_completed(futures):
+                example, extra_args = futures[future]
+                returncode, output = future.result()
+                print(f"\n=== Running example '{example.name}' ===")
+                sys.stdout.write(output)
+                sys.stdout.flush()
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(
+                        returncode, cargo_run_cmd(extra_args)
+                    )
+        except BaseException:
+            # Fail fast, don't wait for the other examples to finish
+            kill_all()
+            raise
+
+for example, extra_args in serial_runs:
+    print(f"\n=== Running example '{example.name}' ===", flush=True)
+    subprocess.check_call(cargo_run_cmd(extra_args), cwd=example)